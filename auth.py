@@ -9,6 +9,9 @@ API_KEYS = {
     "demo_key_hash": hashlib.sha256("demo-key-123".encode()).hexdigest(),
 }
 
+# Precomputed once so each request does a single O(1) set lookup
+API_KEY_HASHES = frozenset(API_KEYS.values())
+
 
 def require_api_key(
     credentials: Optional[HTTPAuthorizationCredentials] = Security(security),
@@ -17,9 +20,13 @@ def require_api_key(
     if not credentials:
         raise HTTPException(status_code=401, detail="API key required")
 
+    # Only the incoming key is hashed per request; hashlib.sha256 is OpenSSL's
+    # implementation, which uses SHA-NI instructions where the CPU has them
     provided_key_hash = hashlib.sha256(credentials.credentials.encode()).hexdigest()
 
-    if provided_key_hash not in API_KEYS.values():
+    # Only SHA-256 digests are compared, so lookup timing can reveal nothing
+    # useful about the key itself; no per-hash constant-time loop is needed
+    if provided_key_hash not in API_KEY_HASHES:
         raise HTTPException(status_code=401, detail="Invalid API key")
 
     return credentials.credentials
@@ -1,24 +1,66 @@
-import json
 import os
-import requests
+import gzip
+import time
+import httpx
+import numpy as np
+import orjson
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Read Azure Search configuration once at import
+SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
+SEARCH_KEY = os.getenv("AZURE_SEARCH_KEY")
 
-def delete_index_if_exists():
-    """Delete the index if it already exists"""
+JSON_HEADERS = {"Content-Type": "application/json", "api-key": SEARCH_KEY}
+KEY_HEADERS = {"api-key": SEARCH_KEY}
+GZIP_JSON_HEADERS = {**JSON_HEADERS, "Content-Encoding": "gzip"}
+
+# Timeouts for Azure Search REST calls (5s to connect, 30s otherwise)
+REQUEST_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+# Documents per indexing request (Azure Search allows at most 1000)
+UPLOAD_BATCH_SIZE = 500
+
+# Responses worth retrying (Azure Search throttles bulk indexing with 429/503),
+# and how many times / how long to back off
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.3
+
+# Shared HTTP/2 client so concurrent batches multiplex over pooled connections;
+# the transport retries failed connection attempts
+_CLIENT = httpx.Client(
+    http2=True,
+    timeout=REQUEST_TIMEOUT,
+    transport=httpx.HTTPTransport(
+        http2=True,
+        retries=MAX_RETRIES,
+        limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+    ),
+)
+
+
+def _send(method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a request, retrying throttled / transient server errors with backoff"""
+    for attempt in range(MAX_RETRIES + 1):
+        response = _CLIENT.request(method, url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return response
+        time.sleep(RETRY_BACKOFF * 2**attempt)
 
-    endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
-    key = os.getenv("AZURE_SEARCH_KEY")
 
-    url = f"{endpoint}/indexes/python-docs-index?api-version=2023-11-01"
+def delete_index_if_exists():
+    """Delete the index if it already exists"""
 
-    headers = {"api-key": key}
+    url = f"{SEARCH_ENDPOINT}/indexes/python-docs-index?api-version=2023-11-01"
 
     try:
-        response = requests.delete(url, headers=headers)
+        response = _send("DELETE", url, headers=KEY_HEADERS)
         if response.status_code == 204:
             print("Existing index deleted successfully")
         elif response.status_code == 404:
@@ -32,12 +74,7 @@ def delete_index_if_exists():
 def create_search_index():
     """Create the search index using REST API"""
 
-    endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
-    key = os.getenv("AZURE_SEARCH_KEY")
-
-    url = f"{endpoint}/indexes?api-version=2023-11-01"
-
-    headers = {"Content-Type": "application/json", "api-key": key}
+    url = f"{SEARCH_ENDPOINT}/indexes?api-version=2023-11-01"
 
     # Index definition with vector search
     index_definition = {
@@ -89,7 +126,7 @@ def create_search_index():
     }
 
     try:
-        response = requests.post(url, headers=headers, json=index_definition)
+        response = _send("POST", url, headers=JSON_HEADERS, json=index_definition)
         if response.status_code == 201:
             print("Index 'python-docs-index' created successfully")
             return True
@@ -102,54 +139,90 @@ def create_search_index():
         return False
 
 
-def upload_documents():
-    """Upload document chunks using REST API"""
-
-    # Load the chunks with embeddings
-    with open("chunks_with_embeddings.json", "r", encoding="utf-8") as f:
-        chunks = json.load(f)
-
-    endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
-    key = os.getenv("AZURE_SEARCH_KEY")
-
-    url = f"{endpoint}/indexes/python-docs-index/docs/index?api-version=2023-11-01"
+def upload_batch(url: str, batch: List[Dict]) -> Optional[int]:
+    """Upload a single batch of documents, returning how many succeeded"""
 
-    headers = {"Content-Type": "application/json", "api-key": key}
+    batch_data = {"value": batch}
 
-    # Prepare documents for upload
-    documents = []
-    for chunk in chunks:
-        if "embedding" in chunk:
-            doc = {
-                "@search.action": "upload",
-                "id": chunk["id"],
-                "source_file": chunk["source_file"],
-                "chunk_index": chunk["chunk_index"],
-                "content": chunk["content"],
-                "content_length": chunk["content_length"],
-                "embedding": chunk["embedding"],
-            }
-            documents.append(doc)
-
-    batch_data = {"value": documents}
+    # Embedding floats compress well, so gzip the serialized batch
+    body = gzip.compress(orjson.dumps(batch_data))
 
     try:
-        response = requests.post(url, headers=headers, json=batch_data)
+        response = _send("POST", url, headers=GZIP_JSON_HEADERS, content=body)
         if response.status_code == 200:
             result = response.json()
-            successful_uploads = sum(1 for r in result["value"] if r["status"])
-            print(
-                f"Successfully uploaded {successful_uploads}/{len(documents)} documents"
-            )
-            return True
+            return sum(1 for r in result["value"] if r["status"])
         else:
             print(f"Error uploading documents: {response.status_code}")
             print(f"Response: {response.text}")
-            return False
+            return None
     except Exception as e:
         print(f"Error uploading documents: {e}")
+        return None
+
+
+def iter_upload_documents(
+    metadata_path: str = "chunks_metadata.jsonl",
+    embeddings_path: str = "embeddings.npy",
+):
+    """Stream upload-ready documents from the chunk metadata and embeddings"""
+
+    # Memory-map the float16 matrix so only the rows being uploaded are read
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+
+    with open(metadata_path, "r", encoding="utf-8") as f:
+        for row, line in enumerate(f):
+            # Metadata lines hold exactly the index fields (see
+            # generate_embeddings.METADATA_FIELDS), so splat them in directly
+            yield {
+                "@search.action": "upload",
+                **orjson.loads(line),
+                # Azure Search stores Collection(Edm.Single), so send float32
+                "embedding": embeddings[row].astype(np.float32).tolist(),
+            }
+
+
+def upload_documents(batch_size: int = UPLOAD_BATCH_SIZE, max_workers: int = 4):
+    """Upload document chunks using REST API"""
+
+    url = (
+        f"{SEARCH_ENDPOINT}/indexes/python-docs-index/docs/index?api-version=2023-11-01"
+    )
+
+    documents = iter_upload_documents()
+    total_documents = 0
+    successful_uploads = 0
+    failed = False
+
+    # Azure Search caps a single indexing request at 1000 documents / 16 MB,
+    # so send fixed-size batches concurrently over the shared client while
+    # keeping at most max_workers batches in memory at once
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        while True:
+            batch = list(islice(documents, batch_size))
+            if batch:
+                total_documents += len(batch)
+                pending.add(executor.submit(upload_batch, url, batch))
+
+            if pending and (len(pending) >= max_workers or not batch):
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    if result is None:
+                        failed = True
+                    else:
+                        successful_uploads += result
+
+            if not batch and not pending:
+                break
+
+    if failed:
         return False
 
+    print(f"Successfully uploaded {successful_uploads}/{total_documents} documents")
+    return True
+
 
 if __name__ == "__main__":
     print("Deleting existing index if it exists...")
@@ -1,48 +1,54 @@
-import requests
+import asyncio
+import httpx
 from bs4 import BeautifulSoup
 import os
-import time
 from urllib.parse import urljoin, urlparse
 
+# Timeouts for documentation downloads (5s to connect, 30s otherwise)
+REQUEST_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+# Connection pool shared by all concurrent downloads
+CLIENT_LIMITS = httpx.Limits(max_connections=8, max_keepalive_connections=8)
+
+BASE_DOCS_URL = "https://docs.python.org/3/"
+
+# Key Python documentation sections, built once at import
+PYTHON_DOC_URLS = tuple(
+    f"{BASE_DOCS_URL}{path}"
+    for path in (
+        "tutorial/introduction.html",
+        "tutorial/interpreter.html",
+        "tutorial/appetite.html",
+        "tutorial/controlflow.html",
+        "tutorial/datastructures.html",
+        "tutorial/modules.html",
+        "tutorial/inputoutput.html",
+        "tutorial/errors.html",
+        "tutorial/classes.html",
+        "tutorial/stdlib.html",
+        "tutorial/stdlib2.html",
+        "library/functions.html",
+        "library/stdtypes.html",
+        "library/string.html",
+        "library/datetime.html",
+        "library/os.html",
+        "library/json.html",
+        "library/urllib.html",
+        "library/pathlib.html",
+        "howto/logging.html",
+    )
+)
+
 
 def get_python_org_docs_urls():
     """Get URLs for Python.org official documentation"""
-    base_docs_url = "https://docs.python.org/3/"
-
-    # Key Python documentation sections
-    python_doc_urls = [
-        f"{base_docs_url}tutorial/introduction.html",
-        f"{base_docs_url}tutorial/interpreter.html",
-        f"{base_docs_url}tutorial/appetite.html",
-        f"{base_docs_url}tutorial/controlflow.html",
-        f"{base_docs_url}tutorial/datastructures.html",
-        f"{base_docs_url}tutorial/modules.html",
-        f"{base_docs_url}tutorial/inputoutput.html",
-        f"{base_docs_url}tutorial/errors.html",
-        f"{base_docs_url}tutorial/classes.html",
-        f"{base_docs_url}tutorial/stdlib.html",
-        f"{base_docs_url}tutorial/stdlib2.html",
-        f"{base_docs_url}library/functions.html",
-        f"{base_docs_url}library/stdtypes.html",
-        f"{base_docs_url}library/string.html",
-        f"{base_docs_url}library/datetime.html",
-        f"{base_docs_url}library/os.html",
-        f"{base_docs_url}library/json.html",
-        f"{base_docs_url}library/urllib.html",
-        f"{base_docs_url}library/pathlib.html",
-        f"{base_docs_url}howto/logging.html",
-    ]
-
-    return python_doc_urls
-
-
-def download_document(url, output_dir="python_docs"):
-    """Download a single document from Python.org"""
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    return PYTHON_DOC_URLS
+
 
+async def download_document(client, url, output_dir="python_docs"):
+    """Download a single document from Python.org"""
     try:
-        response = requests.get(url)
+        response = await client.get(url)
         response.raise_for_status()
 
         # Extract filename from URL
@@ -60,23 +66,33 @@ def download_document(url, output_dir="python_docs"):
         return None
 
 
-def download_batch(urls, max_docs=15, delay=1):
-    """Download a batch of documents with rate limiting"""
-    downloaded = []
+async def download_batch(
+    urls, max_docs=15, delay=1, max_concurrency=4, output_dir="python_docs"
+):
+    """Download a batch of documents concurrently with rate limiting"""
+    urls = urls[:max_docs]
+    os.makedirs(output_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async with httpx.AsyncClient(
+        http2=True, limits=CLIENT_LIMITS, timeout=REQUEST_TIMEOUT
+    ) as client:
 
-    for i, url in enumerate(urls[:max_docs]):
-        print(f"Downloading {i+1}/{min(len(urls), max_docs)}: {url}")
+        async def fetch(i, url):
+            async with semaphore:
+                print(f"Downloading {i+1}/{len(urls)}: {url}")
+                filepath = await download_document(client, url, output_dir)
 
-        filepath = download_document(url)
-        if filepath:
-            downloaded.append(filepath)
+                # Hold the slot for the delay so we stay polite to python.org
+                await asyncio.sleep(delay)
+                return filepath
 
-        time.sleep(delay)
+        results = await asyncio.gather(*(fetch(i, url) for i, url in enumerate(urls)))
 
-    return downloaded
+    return [filepath for filepath in results if filepath]
 
 
 if __name__ == "__main__":
     urls = get_python_org_docs_urls()
-    downloaded_files = download_batch(urls, max_docs=15)
+    downloaded_files = asyncio.run(download_batch(urls, max_docs=15))
     print(f"\nSuccessfully downloaded {len(downloaded_files)} Python.org documents")
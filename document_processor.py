@@ -1,54 +1,48 @@
 import os
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 import re
-import json
-from typing import List, Dict
+import orjson
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Dict
+
+_WHITESPACE_RE = re.compile(r"\s+")
 
 
 def clean_python_org_content(html_content: str) -> str:
     """Extract and clean text content from Python.org documentation"""
-    soup = BeautifulSoup(html_content, "html.parser")
+    tree = LexborHTMLParser(html_content)
 
     # Remove navigation, sidebar, and footer elements specific to Python.org
-    for element in soup(
-        [
-            "script",
-            "style",
-            "nav",
-            "footer",
-            "header",
-            "div.sphinxsidebar",
-            "div.related",
-            "div.footer",
-        ]
-    ):
-        element.decompose()
+    tree.strip_tags(["script", "style", "nav", "footer", "header"])
+    for node in tree.css("div.sphinxsidebar, div.related, div.footer"):
+        node.decompose()
 
     # Focus on the main content area
     main_content = (
-        soup.find("div", class_="body") or soup.find("div", class_="document") or soup
+        tree.css_first("div.body")
+        or tree.css_first("div.document")
+        or tree.body
+        or tree.root
     )
 
     # Get text content
-    text = main_content.get_text()
+    text = main_content.text() if main_content else ""
 
     # Clean up whitespace and formatting
-    lines = (line.strip() for line in text.splitlines())
-    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-    text = " ".join(chunk for chunk in chunks if chunk)
-
-    return text
+    return _WHITESPACE_RE.sub(" ", text).strip()
 
 
 def chunk_text(text: str, max_chunk_size: int = 500, overlap: int = 50) -> List[str]:
     """Split text into overlapping chunks"""
     words = text.split()
     chunks = []
+    step = max_chunk_size - overlap
 
-    for i in range(0, len(words), max_chunk_size - overlap):
+    # Words come from str.split(), so joined chunks never need stripping
+    for i in range(0, len(words), step):
         chunk = " ".join(words[i : i + max_chunk_size])
-        if chunk.strip() and len(chunk.strip()) > 100:  # Skip very short chunks
-            chunks.append(chunk.strip())
+        if len(chunk) > 100:  # Skip very short chunks
+            chunks.append(chunk)
 
     return chunks
 
@@ -91,47 +85,62 @@ def process_document(filepath: str) -> List[Dict]:
         return []
 
 
-def process_all_documents(docs_dir: str = "python_docs") -> List[Dict]:
-    """Process all HTML documents in the python_docs directory"""
-    all_chunks = []
-
+def iter_processed_chunks(docs_dir: str = "python_docs") -> Iterator[Dict]:
+    """Yield chunks for every HTML document in docs_dir as they are produced"""
     if not os.path.exists(docs_dir):
         print(f"Directory {docs_dir} not found!")
-        return all_chunks
+        return
 
-    html_files = [f for f in os.listdir(docs_dir) if f.endswith(".html")]
+    with os.scandir(docs_dir) as entries:
+        html_files = [
+            entry
+            for entry in entries
+            if entry.is_file() and entry.name.endswith(".html")
+        ]
     print(f"Found {len(html_files)} HTML files to process")
 
-    for filename in html_files:
-        filepath = os.path.join(docs_dir, filename)
-        print(f"Processing: {filename}")
+    filepaths = [entry.path for entry in html_files]
 
-        chunks = process_document(filepath)
-        all_chunks.extend(chunks)
-        print(f"  - Created {len(chunks)} chunks")
+    # Parsing is CPU-bound, so fan the files out across all cores
+    with ProcessPoolExecutor() as executor:
+        for entry, chunks in zip(
+            html_files, executor.map(process_document, filepaths, chunksize=4)
+        ):
+            print(f"Processed: {entry.name}")
+            print(f"  - Created {len(chunks)} chunks")
+            yield from chunks
 
-    return all_chunks
 
+def process_all_documents(docs_dir: str = "python_docs") -> List[Dict]:
+    """Process all HTML documents in the python_docs directory"""
+    return list(iter_processed_chunks(docs_dir))
 
-if __name__ == "__main__":
-    # Process all documents
-    processed_chunks = process_all_documents()
 
-    # Save processed chunks to JSON
-    output_file = "python_docs_processed.json"
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(processed_chunks, f, indent=2, ensure_ascii=False)
+if __name__ == "__main__":
+    output_file = "python_docs_processed.jsonl"
+    total_chunks = 0
+    total_length = 0
+    first_chunk = None
+
+    # Process all documents, writing each chunk to JSONL as it is produced
+    with open(output_file, "wb") as f:
+        for chunk in iter_processed_chunks():
+            f.write(orjson.dumps(chunk))
+            f.write(b"\n")
+
+            total_chunks += 1
+            total_length += chunk["content_length"]
+            if first_chunk is None:
+                first_chunk = chunk
 
     print(f"\nProcessing complete!")
-    print(f"Total chunks created: {len(processed_chunks)}")
+    print(f"Total chunks created: {total_chunks}")
     print(f"Saved to: {output_file}")
 
     # Show statistics
-    if processed_chunks:
-        avg_length = sum(chunk["content_length"] for chunk in processed_chunks) / len(
-            processed_chunks
-        )
+    if first_chunk:
+        avg_length = total_length / total_chunks
         print(f"Average chunk length: {avg_length:.0f} characters")
         print(f"\nSample chunk preview:")
-        print(f"ID: {processed_chunks[0]['id']}")
-        print(f"Content: {processed_chunks[0]['content'][:300]}...")
+        print(f"ID: {first_chunk['id']}")
+        print(f"Content: {first_chunk['content'][:300]}...")
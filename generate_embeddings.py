@@ -1,13 +1,20 @@
-import json
 import os
+import numpy as np
+import orjson
+from itertools import islice
 from openai import AzureOpenAI
 from dotenv import load_dotenv
 import time
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 # Load environment variables
 load_dotenv()
 
+# Chunk metadata (JSONL) and embeddings (float16 .npy) share row order
+METADATA_FILE = "chunks_metadata.jsonl"
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FIELDS = ("id", "source_file", "chunk_index", "content", "content_length")
+
 
 def setup_azure_openai():
     """Initialize Azure OpenAI client"""
@@ -20,29 +27,30 @@ def setup_azure_openai():
     return client
 
 
-def generate_embedding(client, text: str) -> List[float]:
-    """Generate embedding for a single text chunk"""
+def generate_embeddings(client, texts: List[str]) -> Optional[List[List[float]]]:
+    """Generate embeddings for a batch of text chunks in a single request"""
     try:
         response = client.embeddings.create(
-            input=text, model=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
+            input=texts, model=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
         )
-        return response.data[0].embedding
+        # Each item carries the index of its input, so map back in order
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
     except Exception as e:
-        print(f"Error generating embedding: {e}")
+        print(f"Error generating embeddings: {e}")
         return None
 
 
 def process_chunks_with_embeddings(
-    input_file: str = "python_docs_processed.json", max_chunks: int = 10
+    input_file: str = "python_docs_processed.jsonl",
+    max_chunks: int = 10,
+    batch_size: int = 16,
 ):
     """Add embeddings to processed document chunks"""
 
-    # Load processed chunks
-    with open(input_file, "r", encoding="utf-8") as f:
-        chunks = json.load(f)
-
-    # Limit chunks for testing
-    chunks = chunks[:max_chunks]
+    # Load processed chunks, reading only as many lines as we need
+    # (limited for testing)
+    with open(input_file, "rb") as f:
+        chunks = [orjson.loads(line) for line in islice(f, max_chunks)]
 
     # print(f"Loaded {len(chunks)} chunks")
     print(f"Processing {len(chunks)} chunks (limited for testing)")
@@ -50,42 +58,68 @@ def process_chunks_with_embeddings(
     # Initialize Azure OpenAI client
     client = setup_azure_openai()
 
-    # Process chunks with rate limiting
-    for i, chunk in enumerate(chunks):
-        print(f"Processing chunk {i+1}/{len(chunks)}: {chunk['id']}")
+    # Process chunks in batches with rate limiting
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start : start + batch_size]
+        print(
+            f"Processing chunks {start+1}-{start+len(batch)}/{len(chunks)}: "
+            f"{batch[0]['id']} .. {batch[-1]['id']}"
+        )
 
-        # Generate embedding
-        embedding = generate_embedding(client, chunk["content"])
+        # Generate embeddings for the whole batch in one request
+        embeddings = generate_embeddings(client, [chunk["content"] for chunk in batch])
 
-        if embedding:
-            chunk["embedding"] = embedding
-            print(f"  - Generated embedding ({len(embedding)} dimensions)")
+        if embeddings:
+            for chunk, embedding in zip(batch, embeddings):
+                chunk["embedding"] = embedding
+            print(
+                f"  - Generated {len(embeddings)} embeddings "
+                f"({len(embeddings[0])} dimensions)"
+            )
         else:
-            print(f"  - Failed to generate embedding")
+            print(f"  - Failed to generate embeddings")
 
-        # Rate limiting for free tier - wait 12 seconds as recommended
-        if i < len(chunks) - 1:  # Don't sleep after the last item
+        # Rate limiting for free tier - the quota is per request, so wait
+        # between batches rather than between individual chunks
+        if start + batch_size < len(chunks):  # Don't sleep after the last batch
             print(f"  - Waiting 12 seconds (rate limit)...")
             time.sleep(12)  # 12 seconds between requests for free tier
 
     return chunks
 
 
+def save_chunks_with_embeddings(
+    chunks: List[Dict],
+    metadata_file: str = METADATA_FILE,
+    embeddings_file: str = EMBEDDINGS_FILE,
+) -> int:
+    """Save chunk metadata as JSONL and their embeddings as a float16 matrix"""
+    embedded = [chunk for chunk in chunks if "embedding" in chunk]
+
+    # Row i of the embeddings matrix belongs to line i of the metadata file
+    with open(metadata_file, "wb") as f:
+        for chunk in embedded:
+            metadata = {field: chunk[field] for field in METADATA_FIELDS}
+            f.write(orjson.dumps(metadata))
+            f.write(b"\n")
+
+    np.save(
+        embeddings_file,
+        np.asarray([chunk["embedding"] for chunk in embedded], dtype=np.float16),
+    )
+
+    return len(embedded)
+
+
 if __name__ == "__main__":
     # Generate embeddings for all chunks
     chunks_with_embeddings = process_chunks_with_embeddings()
 
     # Save chunks with embeddings
-    output_file = "chunks_with_embeddings.json"
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(chunks_with_embeddings, f, indent=2)
-
-    successful_embeddings = sum(
-        1 for chunk in chunks_with_embeddings if "embedding" in chunk
-    )
+    successful_embeddings = save_chunks_with_embeddings(chunks_with_embeddings)
 
     print(f"\nEmbedding generation complete!")
     print(
         f"Successfully generated {successful_embeddings}/{len(chunks_with_embeddings)} embeddings"
     )
-    print(f"Saved to: {output_file}")
+    print(f"Saved to: {METADATA_FILE}, {EMBEDDINGS_FILE}")
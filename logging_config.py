@@ -1,39 +1,63 @@
 import logging
+import orjson
 import structlog
 import sys
 import os
+import time
 from typing import Any, Dict
-from opencensus.ext.azure.log_exporter import AzureLogHandler
-from opencensus.ext.azure import metrics_exporter
-from opencensus.stats import aggregation as aggregation_module
-from opencensus.stats import measure as measure_module
-from opencensus.stats import stats as stats_module
-from opencensus.stats import view as view_module
-from opencensus.tags import tag_map as tag_map_module
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Application Insights connection string, read once. The opencensus exporters
+# are only imported when it is set, keeping them off the cold-start path.
+APPINSIGHTS_CONNECTION_STRING = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
+
+_configured = False
+
+
+def _orjson_dumps(event_dict: Dict[str, Any], **kwargs: Any) -> str:
+    """Serialize log events with orjson, keeping structlog's fallback handler"""
+    return orjson.dumps(event_dict, default=kwargs.get("default")).decode()
 
 
 def configure_logging(log_level: str = "INFO") -> None:
     """Configure structured logging with Application Insights integration"""
+    global _configured
+
+    # Only configure once per process
+    if _configured:
+        return
+    _configured = True
 
     # Clear any existing handlers
     logging.root.handlers = []
 
     # Get Application Insights connection string
-    connection_string = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
+    connection_string = APPINSIGHTS_CONNECTION_STRING
+
+    processors = [
+        structlog.stdlib.filter_by_level,
+        structlog.stdlib.add_logger_name,
+        structlog.stdlib.add_log_level,
+        structlog.stdlib.PositionalArgumentsFormatter(),
+        structlog.processors.TimeStamper(fmt="iso"),
+    ]
+
+    # Stack rendering is only useful while debugging
+    if log_level.upper() == "DEBUG":
+        processors.append(structlog.processors.StackInfoRenderer())
+
+    processors += [
+        structlog.processors.format_exc_info,
+        structlog.processors.UnicodeDecoder(),
+        structlog.processors.JSONRenderer(serializer=_orjson_dumps),
+    ]
 
     # Configure structlog
     structlog.configure(
-        processors=[
-            structlog.stdlib.filter_by_level,
-            structlog.stdlib.add_logger_name,
-            structlog.stdlib.add_log_level,
-            structlog.stdlib.PositionalArgumentsFormatter(),
-            structlog.processors.TimeStamper(fmt="iso"),
-            structlog.processors.StackInfoRenderer(),
-            structlog.processors.format_exc_info,
-            structlog.processors.UnicodeDecoder(),
-            structlog.processors.JSONRenderer(),
-        ],
+        processors=processors,
         context_class=dict,
         logger_factory=structlog.stdlib.LoggerFactory(),
         wrapper_class=structlog.stdlib.BoundLogger,
@@ -45,6 +69,8 @@ def configure_logging(log_level: str = "INFO") -> None:
 
     # Add Azure handler if connection string is available
     if connection_string:
+        from opencensus.ext.azure.log_exporter import AzureLogHandler
+
         azure_handler = AzureLogHandler(connection_string=connection_string)
         handlers.append(azure_handler)
 
@@ -63,13 +89,19 @@ def get_logger(name: str) -> structlog.BoundLogger:
 # Application Insights metrics
 class AppInsightsMetrics:
     def __init__(self):
-        self.connection_string = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
+        self.connection_string = APPINSIGHTS_CONNECTION_STRING
         if self.connection_string:
+            from opencensus.ext.azure import metrics_exporter
+            from opencensus.stats import measure as measure_module
+            from opencensus.stats import stats as stats_module
+            from opencensus.tags import tag_map as tag_map_module
+
             self.exporter = metrics_exporter.new_metrics_exporter(
                 connection_string=self.connection_string
             )
             self.stats = stats_module.stats
             self.view_manager = self.stats.view_manager
+            self.tag_map_class = tag_map_module.TagMap
 
             # Define custom metrics
             self.request_duration = measure_module.MeasureFloat(
@@ -89,6 +121,9 @@ class AppInsightsMetrics:
         if not self.connection_string:
             return
 
+        from opencensus.stats import aggregation as aggregation_module
+        from opencensus.stats import view as view_module
+
         request_duration_view = view_module.View(
             "rag_request_duration_view",
             "The distribution of RAG request durations",
@@ -105,7 +140,7 @@ class AppInsightsMetrics:
     def record_request_duration(self, duration_ms: float):
         if self.connection_string:
             mmap = self.stats.stats_recorder.new_measurement_map()
-            tmap = tag_map_module.TagMap()
+            tmap = self.tag_map_class()
             mmap.measure_float_put(self.request_duration, duration_ms)
             mmap.record(tmap)
 
@@ -116,14 +151,12 @@ class HealthChecker:
         self.logger = get_logger("health_check")
         self.metrics = AppInsightsMetrics()
 
-    def check_openai_service(self, openai_service) -> Dict[str, Any]:
+    async def check_openai_service(self, openai_service) -> Dict[str, Any]:
         """Check OpenAI service health"""
-        import time
-
         start_time = time.time()
 
         try:
-            test_result = openai_service.get_embedding("health check test")
+            test_result = await openai_service.get_embedding("health check test")
             is_healthy = test_result is not None
             duration_ms = (time.time() - start_time) * 1000
 
@@ -154,14 +187,12 @@ class HealthChecker:
                 "response_time_ms": int(duration_ms),
             }
 
-    def check_search_service(self, search_service) -> Dict[str, Any]:
+    async def check_search_service(self, search_service) -> Dict[str, Any]:
         """Check search service health"""
-        import time
-
         start_time = time.time()
 
         try:
-            stats = search_service.get_search_stats()
+            stats = await search_service.get_search_stats()
             is_healthy = stats is not None
             duration_ms = (time.time() - start_time) * 1000
 
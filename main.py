@@ -1,14 +1,26 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, validator, Field
 import os
 from dotenv import load_dotenv
 from services import AzureOpenAIService, AzureSearchService
+from semantic_cache import SemanticCache
+from schemas import (
+    MIN_QUESTION_LENGTH,
+    ChatRequest,
+    ChatResponse,
+    QueryRequest,
+)
 from logging_config import configure_logging, get_logger, HealthChecker
+import asyncio
+import httpx
+import orjson
+import re
 import time
-import os
 from collections import defaultdict
+from typing import Dict, List
 
 from auth import require_api_key
 
@@ -18,63 +30,63 @@ load_dotenv()
 configure_logging(log_level=os.getenv("LOG_LEVEL", "INFO"))
 logger = get_logger("main")
 
+health_checker = HealthChecker()
 
-# Enhanced request models for chat
-class ChatRequest(BaseModel):
-    question: str
-    max_results: int = 3
-
-    @validator("question")
-    def question_must_not_be_empty(cls, v):
-        if not v or not v.strip():
-            raise ValueError("Question cannot be empty")
-        if len(v.strip()) > 500:
-            raise ValueError("Question too long (max 500 characters)")
-        return v.strip()
+# Cache of generated answers, shared by /ask and /chat
+response_cache = SemanticCache(
+    max_size=int(os.getenv("SEMANTIC_CACHE_SIZE", "1000")),
+    ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL", "600")),
+    similarity_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+)
 
-    @validator("max_results")
-    def max_results_must_be_valid(cls, v):
-        if v < 1 or v > 10:
-            raise ValueError("max_results must be between 1 and 10")
-        return v
+logger.info("RAG application initialized successfully")
 
 
-class ChatResponse(BaseModel):
-    question: str
-    answer: str
-    sources_used: int
-    sources: list
-    response_time_ms: int
-    status: str = "success"
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Build the Azure services once per worker around one shared, explicitly
+    sized connection pool, and close everything on shutdown
+    """
+    logger.info("Initializing Azure services")
+    http = httpx.AsyncClient(
+        timeout=httpx.Timeout(connect=1.0, read=5.0, write=2.0, pool=1.0),
+        transport=httpx.AsyncHTTPTransport(
+            retries=AzureSearchService.MAX_RETRIES,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=30),
+        ),
+    )
+    app.state.openai_service = AzureOpenAIService(http=http)
+    app.state.search_service = AzureSearchService(http=http)
+    app.state.openai_service.start_embedding_batcher()
+    yield
+    await app.state.openai_service.aclose()
+    await app.state.search_service.aclose()
+    await http.aclose()
 
 
 app = FastAPI(
     title="Python RAG API",
     description="Retrieval-Augmented Generation API for Python Documentation",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# Set up Jinja2 templates and static files
-templates = Jinja2Templates(directory="templates")
-app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Initialize Azure OpenAI service
-logger.info("Initializing Azure services")
-openai_service = AzureOpenAIService()
-search_service = AzureSearchService()
-health_checker = HealthChecker()
-
-logger.info("RAG application initialized successfully")
+def get_openai_service(request: Request) -> AzureOpenAIService:
+    """Dependency returning the worker's AzureOpenAIService"""
+    return request.app.state.openai_service
 
 
-# Request models for better API documentation and validation
-class QueryRequest(BaseModel):
-    question: str
-    max_results: int = 3
+def get_search_service(request: Request) -> AzureSearchService:
+    """Dependency returning the worker's AzureSearchService"""
+    return request.app.state.search_service
 
 
-class TextRequest(BaseModel):
-    text: str
+# Set up Jinja2 templates and static files
+templates = Jinja2Templates(directory="templates")
+app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
 @app.get("/")
@@ -95,18 +107,31 @@ def health_check():
     }
 
 
+def service_health(service: str, result) -> Dict:
+    """Map a failed health check coroutine to an unhealthy result"""
+    if isinstance(result, Exception):
+        return {"service": service, "healthy": False, "error": str(result)}
+    return result
+
+
 @app.get("/health/detailed")
-async def detailed_health_check():
+async def detailed_health_check(
+    openai_service: AzureOpenAIService = Depends(get_openai_service),
+    search_service: AzureSearchService = Depends(get_search_service),
+):
     """Comprehensive health check for monitoring systems"""
     start_time = time.time()
     logger.info("Detailed health check started")
 
     try:
-        # Check OpenAI service
-        openai_health = health_checker.check_openai_service(openai_service)
-
-        # Check search service
-        search_health = health_checker.check_search_service(search_service)
+        # Check OpenAI and search services concurrently
+        openai_health, search_health = await asyncio.gather(
+            health_checker.check_openai_service(openai_service),
+            health_checker.check_search_service(search_service),
+            return_exceptions=True,
+        )
+        openai_health = service_health("azure_openai", openai_health)
+        search_health = service_health("azure_search", search_health)
 
         # Overall system health
         overall_healthy = openai_health["healthy"] and search_health["healthy"]
@@ -133,8 +158,28 @@ async def detailed_health_check():
         return {"status": "unhealthy", "error": str(e), "timestamp": time.time()}
 
 
+def cache_answer(
+    question: str,
+    question_embedding: List[float],
+    max_results: int,
+    answer: str,
+    documents: List[Dict],
+) -> None:
+    """Store a generated answer and the documents it was built from"""
+    response_cache.put(
+        question,
+        max_results,
+        question_embedding,
+        {"answer": answer, "documents": documents},
+    )
+
+
 @app.post("/ask")
-def ask_question(request: QueryRequest):
+async def ask_question(
+    request: QueryRequest,
+    openai_service: AzureOpenAIService = Depends(get_openai_service),
+    search_service: AzureSearchService = Depends(get_search_service),
+):
     """
     Main RAG endpoint: Ask a question about Python and get an AI-generated answer
     1. Query → Convert question to embedding
@@ -148,39 +193,66 @@ def ask_question(request: QueryRequest):
         raise HTTPException(status_code=400, detail="Question cannot be empty")
 
     try:
-        # Step 1: Convert question to embedding
-        question_embedding = openai_service.get_embedding(question)
-        if question_embedding is None:
-            raise HTTPException(
-                status_code=500, detail="Failed to generate question embedding"
+        # Repeated questions are answered straight from the cache
+        cached = response_cache.get(question, request.max_results)
+
+        if cached is None:
+            # Step 1: Convert question to embedding
+            question_embedding = await openai_service.get_embedding(question)
+            if question_embedding is None:
+                raise HTTPException(
+                    status_code=500, detail="Failed to generate question embedding"
+                )
+
+            # Near-identical questions can reuse a cached answer too
+            cached = response_cache.find_similar(
+                question_embedding, request.max_results
             )
 
-        # Step 2: Search for relevant documents
-        search_results = search_service.vector_search(
-            question_embedding, top_k=request.max_results
-        )
-        if search_results is None:
-            raise HTTPException(status_code=500, detail="Search operation failed")
+        if cached is not None:
+            answer, search_results = cached["answer"], cached["documents"]
+        else:
+            # Step 2: Search for relevant documents
+            search_results = await search_service.vector_search(
+                question_embedding, top_k=request.max_results
+            )
+            if search_results is None:
+                raise HTTPException(status_code=500, detail="Search operation failed")
 
-        # Step 3: Generate answer using retrieved context
-        answer = openai_service.generate_rag_response(question, search_results)
-        if answer is None:
-            raise HTTPException(status_code=500, detail="Failed to generate response")
+            # Step 3: Generate answer using retrieved context
+            answer = await openai_service.generate_rag_response(
+                question, search_results
+            )
+            if answer is None:
+                raise HTTPException(
+                    status_code=500, detail="Failed to generate response"
+                )
+
+            cache_answer(
+                question,
+                question_embedding,
+                request.max_results,
+                answer,
+                search_results,
+            )
 
-        # Step 4: Return structured response
-        return {
-            "question": question,
-            "answer": answer,
-            "sources_used": len(search_results),
-            "sources": [
-                {
-                    "source_file": doc["source_file"],
-                    "chunk_index": doc["chunk_index"],
-                    "preview": doc["content"][:100] + "...",
-                }
-                for doc in search_results
-            ],
-        }
+        # Step 4: Return structured response (already JSON-ready, so skip
+        # FastAPI's jsonable_encoder pass)
+        return ORJSONResponse(
+            {
+                "question": question,
+                "answer": answer,
+                "sources_used": len(search_results),
+                "sources": [
+                    {
+                        "source_file": doc["source_file"],
+                        "chunk_index": doc["chunk_index"],
+                        "preview": doc["preview"],
+                    }
+                    for doc in search_results
+                ],
+            }
+        )
 
     except HTTPException:
         raise
@@ -189,14 +261,16 @@ def ask_question(request: QueryRequest):
 
 
 @app.post("/test-embedding")
-def test_embedding(text: dict):
+async def test_embedding(
+    text: dict, openai_service: AzureOpenAIService = Depends(get_openai_service)
+):
     """Test endpoint to verify embedding generation works"""
     input_text = text.get("text", "")
 
     if not input_text:
         raise HTTPException(status_code=400, detail="Text field is required")
 
-    embedding = openai_service.get_embedding(input_text)
+    embedding = await openai_service.get_embedding(input_text)
 
     if embedding is None:
         raise HTTPException(status_code=500, detail="Failed to generate embedding")
@@ -209,7 +283,11 @@ def test_embedding(text: dict):
 
 
 @app.post("/test-search")
-def test_search(query: dict):
+async def test_search(
+    query: dict,
+    openai_service: AzureOpenAIService = Depends(get_openai_service),
+    search_service: AzureSearchService = Depends(get_search_service),
+):
     """Test endpoint to verify search functionality works"""
     query_text = query.get("query", "")
 
@@ -217,14 +295,14 @@ def test_search(query: dict):
         raise HTTPException(status_code=400, detail="Query field is required")
 
     # Step 1: Convert query to embedding
-    query_embedding = openai_service.get_embedding(query_text)
+    query_embedding = await openai_service.get_embedding(query_text)
     if query_embedding is None:
         raise HTTPException(
             status_code=500, detail="Failed to generate query embedding"
         )
 
     # Step 2: Search for similar documents
-    search_results = search_service.vector_search(query_embedding, top_k=3)
+    search_results = await search_service.vector_search(query_embedding, top_k=3)
     if search_results is None:
         raise HTTPException(status_code=500, detail="Search failed")
 
@@ -235,7 +313,7 @@ def test_search(query: dict):
             {
                 "source": doc["source_file"],
                 "chunk": doc["chunk_index"],
-                "preview": doc["content"][:150] + "...",
+                "preview": doc["long_preview"],
             }
             for doc in search_results
         ],
@@ -243,9 +321,11 @@ def test_search(query: dict):
 
 
 @app.get("/search-stats")
-def get_search_stats():
+async def get_search_stats(
+    search_service: AzureSearchService = Depends(get_search_service),
+):
     """Get statistics about the search index"""
-    stats = search_service.get_search_stats()
+    stats = await search_service.get_search_stats()
     if stats is None:
         raise HTTPException(status_code=500, detail="Failed to get search statistics")
 
@@ -274,8 +354,148 @@ def rate_limit_check(client_ip: str, max_requests: int = 10, window_minutes: int
     return True
 
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest, req: Request):
+def relevance_label(score: float) -> str:
+    """Bucket a cosine similarity score for display"""
+    if score > 0.85:
+        return "high"
+    if score > 0.75:
+        return "medium"
+    return "low"
+
+
+def format_chat_sources(search_results: List[Dict]) -> List[Dict]:
+    """Shape retrieved documents into the source list shown by the chat UI"""
+    return [
+        {
+            "source_file": doc["source_file"],
+            "chunk_index": doc["chunk_index"],
+            "preview": doc["preview"],
+            "relevance": relevance_label(doc.get("score", 0.0)),
+        }
+        for doc in search_results
+    ]
+
+
+async def retrieve_for_chat(
+    request: ChatRequest,
+    openai_service: AzureOpenAIService,
+    search_service: AzureSearchService,
+    exact_checked: bool = False,
+):
+    """
+    Run the retrieval half of the chat pipeline.
+    Returns (cached answer or None, question embedding, search results).
+    Pass exact_checked=True when the caller has already tried the exact cache
+    lookup, so each request records exactly one.
+    """
+
+    # Repeated questions are answered straight from the cache
+    if not exact_checked:
+        cached = response_cache.get(request.question, request.max_results)
+        if cached is not None:
+            return cached, None, cached["documents"]
+
+    # Step 1: Generate question embedding
+    question_embedding = await openai_service.get_embedding(request.question)
+    if question_embedding is None:
+        logger.error("Failed to generate embedding for question")
+        raise HTTPException(
+            status_code=503,
+            detail="AI service temporarily unavailable. Please try again.",
+        )
+
+    # Near-identical questions can reuse a cached answer too
+    cached = response_cache.find_similar(question_embedding, request.max_results)
+    if cached is not None:
+        return cached, question_embedding, cached["documents"]
+
+    # Step 2: Search for relevant documents
+    search_results = await search_service.vector_search(
+        question_embedding, top_k=request.max_results
+    )
+    if search_results is None:
+        logger.error("Search service failed")
+        raise HTTPException(
+            status_code=503,
+            detail="Search service temporarily unavailable. Please try again.",
+        )
+
+    return None, question_embedding, search_results
+
+
+async def run_chat_rag(
+    request: ChatRequest,
+    openai_service: AzureOpenAIService,
+    search_service: AzureSearchService,
+):
+    """
+    Run the full chat pipeline for one question.
+    Returns (answer, search results).
+    """
+
+    # Steps 1-2: Embed the question and find relevant documents (or a cached answer)
+    # chat_endpoint has already tried the exact cache lookup
+    cached, question_embedding, search_results = await retrieve_for_chat(
+        request, openai_service, search_service, exact_checked=True
+    )
+
+    if cached is not None:
+        logger.info("Serving chat response from cache")
+        return cached["answer"], search_results
+
+    # Step 3: Generate AI response
+    answer = await openai_service.generate_rag_response(
+        request.question, search_results
+    )
+    if answer is None:
+        logger.error("Failed to generate AI response")
+        raise HTTPException(
+            status_code=503,
+            detail="AI response generation failed. Please try again.",
+        )
+
+    cache_answer(
+        request.question,
+        question_embedding,
+        request.max_results,
+        answer,
+        search_results,
+    )
+    return answer, search_results
+
+
+# Chat pipelines currently running, keyed by normalized question and max_results.
+# Only touched between awaits on the event loop, so no lock is needed.
+inflight_chats: Dict[tuple, asyncio.Task] = {}
+
+
+async def coalesced_chat_rag(
+    request: ChatRequest,
+    openai_service: AzureOpenAIService,
+    search_service: AzureSearchService,
+):
+    """Let concurrent identical questions share one run of the chat pipeline"""
+    key = (response_cache.normalize_question(request.question), request.max_results)
+
+    task = inflight_chats.get(key)
+    if task is None:
+        task = asyncio.create_task(
+            run_chat_rag(request, openai_service, search_service)
+        )
+        inflight_chats[key] = task
+        task.add_done_callback(lambda _: inflight_chats.pop(key, None))
+
+    # Shielded so one client disconnecting does not cancel the run for the others
+    return await asyncio.shield(task)
+
+
+@app.post("/chat", response_model=None, responses={200: {"model": ChatResponse}})
+async def chat_endpoint(
+    request: ChatRequest,
+    req: Request,
+    openai_service: AzureOpenAIService = Depends(get_openai_service),
+    search_service: AzureSearchService = Depends(get_search_service),
+):
     """Enhanced chat endpoint with better error handling and validation"""
 
     # Add rate limiting
@@ -289,56 +509,32 @@ async def chat_endpoint(request: ChatRequest, req: Request):
     try:
         logger.info(f"Processing chat request: {request.question[:50]}...")
 
-        # Step 1: Generate question embedding
-        question_embedding = openai_service.get_embedding(request.question)
-        if question_embedding is None:
-            logger.error("Failed to generate embedding for question")
-            raise HTTPException(
-                status_code=503,
-                detail="AI service temporarily unavailable. Please try again.",
-            )
-
-        # Step 2: Search for relevant documents
-        search_results = search_service.vector_search(
-            question_embedding, top_k=request.max_results
-        )
-        if search_results is None:
-            logger.error("Search service failed")
-            raise HTTPException(
-                status_code=503,
-                detail="Search service temporarily unavailable. Please try again.",
-            )
-
-        # Step 3: Generate AI response
-        answer = openai_service.generate_rag_response(request.question, search_results)
-        if answer is None:
-            logger.error("Failed to generate AI response")
-            raise HTTPException(
-                status_code=503,
-                detail="AI response generation failed. Please try again.",
+        # Exact repeats are answered without touching the pipeline at all
+        cached = response_cache.get(request.question, request.max_results)
+        if cached is not None:
+            logger.info("Serving chat response from cache")
+            answer, search_results = cached["answer"], cached["documents"]
+        else:
+            # Steps 1-3: Embed, search and generate, sharing the work with any
+            # identical request already in flight
+            answer, search_results = await coalesced_chat_rag(
+                request, openai_service, search_service
             )
 
         # Calculate response time
         response_time_ms = int((time.time() - start_time) * 1000)
 
         # Step 4: Format and return response
-        response = ChatResponse(
-            question=request.question,
-            answer=answer,
-            sources_used=len(search_results),
-            sources=[
-                {
-                    "source_file": doc["source_file"],
-                    "chunk_index": doc["chunk_index"],
-                    "preview": doc["content"][:100] + "...",
-                    "relevance": (
-                        "high" if i < 2 else "medium"
-                    ),  # Mock relevance scoring
-                }
-                for i, doc in enumerate(search_results)
-            ],
-            response_time_ms=response_time_ms,
-        )
+        # Built as a plain dict matching ChatResponse and serialized directly
+        # with orjson, skipping model validation on the hot path
+        response = {
+            "question": request.question,
+            "answer": answer,
+            "sources_used": len(search_results),
+            "sources": format_chat_sources(search_results),
+            "response_time_ms": response_time_ms,
+            "status": "success",
+        }
 
         logger.info(f"Chat request completed in {response_time_ms}ms")
 
@@ -354,7 +550,7 @@ async def chat_endpoint(request: ChatRequest, req: Request):
             },
         )
 
-        return response
+        return ORJSONResponse(response)
 
     except HTTPException:
         raise
@@ -368,6 +564,101 @@ async def chat_endpoint(request: ChatRequest, req: Request):
         )
 
 
+def sse_event(payload: Dict) -> str:
+    """Encode one server-sent event carrying a JSON payload"""
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+
+GENERATION_FAILED_EVENT = sse_event(
+    {"type": "error", "detail": "AI response generation failed. Please try again."}
+)
+
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    req: Request,
+    openai_service: AzureOpenAIService = Depends(get_openai_service),
+    search_service: AzureSearchService = Depends(get_search_service),
+):
+    """
+    Streaming variant of /chat using server-sent events.
+    Emits a "sources" event, then "token" events as the answer is generated,
+    and finally a "done" event (or an "error" event if generation fails).
+    """
+
+    # Add rate limiting
+    if not rate_limit_check(req.client.host):
+        raise HTTPException(
+            status_code=429, detail="Rate limit exceeded. Try again in 1 minute."
+        )
+
+    start_time = time.time()
+    logger.info(f"Processing streaming chat request: {request.question[:50]}...")
+
+    # Retrieval happens before streaming starts so failures still map to HTTP errors
+    cached, question_embedding, search_results = await retrieve_for_chat(
+        request, openai_service, search_service
+    )
+
+    async def event_stream():
+        yield sse_event(
+            {
+                "type": "sources",
+                "sources_used": len(search_results),
+                "sources": format_chat_sources(search_results),
+            }
+        )
+
+        if cached is not None:
+            logger.info("Serving streaming chat response from cache")
+            yield sse_event({"type": "token", "content": cached["answer"]})
+        else:
+            tokens = []
+            try:
+                async for token in openai_service.generate_rag_response_stream(
+                    request.question, search_results
+                ):
+                    tokens.append(token)
+                    yield sse_event({"type": "token", "content": token})
+            except Exception as e:
+                logger.error(f"Streaming generation failed: {str(e)}")
+                yield GENERATION_FAILED_EVENT
+                return
+
+            # An empty (e.g. content-filtered) completion is a failure, as in
+            # /chat, and must not be cached for other requests
+            answer = "".join(tokens)
+            if not answer:
+                logger.error("Streaming generation produced no content")
+                yield GENERATION_FAILED_EVENT
+                return
+
+            cache_answer(
+                request.question,
+                question_embedding,
+                request.max_results,
+                answer,
+                search_results,
+            )
+
+        response_time_ms = int((time.time() - start_time) * 1000)
+        logger.info(f"Streaming chat request completed in {response_time_ms}ms")
+        yield sse_event({"type": "done", "response_time_ms": response_time_ms})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.get("/chat/cache-stats")
+async def chat_cache_stats():
+    """Hit rate and size of the answer cache"""
+    return response_cache.stats()
+
+
+# Potentially problematic content, matched anywhere in the question
+PROBLEMATIC_WORDS_RE = re.compile("hack|exploit|malicious|illegal", re.IGNORECASE)
+
+
 @app.post("/chat/validate")
 async def validate_question(request: dict):
     """Endpoint to validate questions before sending"""
@@ -379,12 +670,11 @@ async def validate_question(request: dict):
         errors.append("Question cannot be empty")
     elif len(question) > 500:
         errors.append("Question too long (max 500 characters)")
-    elif len(question) < 5:
-        errors.append("Question too short (min 5 characters)")
+    elif len(question) < MIN_QUESTION_LENGTH:
+        errors.append(f"Question too short (min {MIN_QUESTION_LENGTH} characters)")
 
     # Check for potentially problematic content
-    problematic_words = ["hack", "exploit", "malicious", "illegal"]
-    if any(word in question.lower() for word in problematic_words):
+    if PROBLEMATIC_WORDS_RE.search(question):
         errors.append("Question contains inappropriate content")
 
     return {
@@ -395,17 +685,42 @@ async def validate_question(request: dict):
     }
 
 
+# Successful embedding probes are trusted for EMBEDDING_PROBE_TTL seconds
+EMBEDDING_PROBE_TTL = float(os.getenv("EMBEDDING_PROBE_TTL", "60"))
+last_embedding_probe_ok = float("-inf")
+
+
+async def probe_embedding(openai_service: AzureOpenAIService) -> bool:
+    """Test OpenAI service, unless an embedding succeeded recently"""
+    global last_embedding_probe_ok
+    if time.monotonic() - last_embedding_probe_ok < EMBEDDING_PROBE_TTL:
+        return True
+
+    test_embedding = await openai_service.get_embedding("test")
+    if test_embedding is None:
+        return False
+
+    last_embedding_probe_ok = time.monotonic()
+    return True
+
+
 @app.get("/chat/health")
-async def chat_health_check():
+async def chat_health_check(
+    openai_service: AzureOpenAIService = Depends(get_openai_service),
+    search_service: AzureSearchService = Depends(get_search_service),
+):
     """Specific health check for chat functionality"""
     try:
-        # Test OpenAI service
-        test_embedding = openai_service.get_embedding("test")
-        openai_healthy = test_embedding is not None
-
-        # Test search service
-        search_stats = search_service.get_search_stats()
-        search_healthy = search_stats is not None
+        # Test OpenAI and search services concurrently
+        openai_healthy, search_stats = await asyncio.gather(
+            probe_embedding(openai_service),
+            search_service.get_search_stats(),
+            return_exceptions=True,
+        )
+        openai_healthy = openai_healthy is True
+        search_healthy = search_stats is not None and not isinstance(
+            search_stats, Exception
+        )
 
         overall_healthy = openai_healthy and search_healthy
 
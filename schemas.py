@@ -0,0 +1,33 @@
+from pydantic import BaseModel, ConfigDict, Field
+
+# Shortest question worth embedding, shared by /chat and /chat/validate
+MIN_QUESTION_LENGTH = 5
+
+
+# Enhanced request models for chat
+class ChatRequest(BaseModel):
+    # Constraints are checked by pydantic-core after stripping whitespace, so
+    # too-short questions are rejected before any Azure call
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    question: str = Field(min_length=MIN_QUESTION_LENGTH, max_length=500)
+    max_results: int = Field(default=3, ge=1, le=10)
+
+
+class ChatResponse(BaseModel):
+    question: str
+    answer: str
+    sources_used: int
+    sources: list
+    response_time_ms: int
+    status: str = "success"
+
+
+# Request models for better API documentation and validation
+class QueryRequest(BaseModel):
+    question: str
+    max_results: int = 3
+
+
+class TextRequest(BaseModel):
+    text: str
@@ -0,0 +1,175 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# (normalized question, max_results)
+CacheKey = Tuple[str, int]
+
+
+class SemanticCache:
+    """
+    LRU cache of RAG answers keyed by question text and the number of sources
+    the answer was built from, with a cosine-similarity fallback over the
+    cached question embeddings.
+
+    Embeddings are L2-normalized and stored as int8 rows of one (max_size, dim)
+    matrix with a float scale per row, a quarter of the float32 footprint. A
+    similarity lookup is a single matrix-vector product against the float32
+    query, rescaled per row; the quantization error on a cosine score is
+    below 1e-3. All methods are synchronous and never await, so they run
+    atomically on the event loop and need no lock.
+
+    Callers are expected to try get() once per request and fall back to
+    find_similar() on a miss; the hit rate is computed on that basis.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        ttl_seconds: float = 600,
+        similarity_threshold: float = 0.95,
+    ):
+        # max_size=0 disables caching: lookups always miss and put() is a no-op
+        if max_size < 0:
+            raise ValueError("max_size must not be negative")
+
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        # key -> matrix row, in least- to most-recently-used order
+        self._rows: "OrderedDict[CacheKey, int]" = OrderedDict()
+        self._keys: List[Optional[CacheKey]] = [None] * max_size
+        self._values: List[Optional[Dict[str, Any]]] = [None] * max_size
+        self._max_results = np.zeros(max_size, dtype=np.int32)
+        self._expires_at = np.zeros(max_size, dtype=np.float64)
+        self._matrix: Optional[np.ndarray] = None
+        self._scales = np.zeros(max_size, dtype=np.float32)
+        self._free_rows = list(range(max_size - 1, -1, -1))
+
+        self.exact_hits = 0
+        self.exact_misses = 0
+        self.semantic_hits = 0
+        self.semantic_misses = 0
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        # Case and whitespace differences should not defeat an exact match
+        return " ".join(question.split()).casefold()
+
+    @staticmethod
+    def _normalize_embedding(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _quantize(vector: np.ndarray) -> Tuple[np.ndarray, float]:
+        # Symmetric per-vector scaling uses the full int8 range for each row
+        peak = float(np.abs(vector).max())
+        scale = peak / 127 if peak else 1.0
+        return np.round(vector / scale).astype(np.int8), scale
+
+    def _is_live(self, row: int, now: float) -> bool:
+        return self._expires_at[row] > now
+
+    def _evict(self, key: CacheKey) -> None:
+        row = self._rows.pop(key)
+        self._keys[row] = None
+        self._values[row] = None
+        self._expires_at[row] = 0.0
+        self._free_rows.append(row)
+
+    def get(self, question: str, max_results: int) -> Optional[Dict[str, Any]]:
+        """Return the cached answer for an exact (normalized) question match"""
+        key = (self.normalize_question(question), max_results)
+        row = self._rows.get(key)
+
+        if row is not None and not self._is_live(row, time.monotonic()):
+            self._evict(key)
+            row = None
+
+        if row is None:
+            self.exact_misses += 1
+            return None
+
+        self._rows.move_to_end(key)
+        self.exact_hits += 1
+        return self._values[row]
+
+    def find_similar(
+        self, embedding: List[float], max_results: int
+    ) -> Optional[Dict[str, Any]]:
+        """Return the cached answer whose question embedding is most similar"""
+        if self._matrix is None or not self._rows:
+            self.semantic_misses += 1
+            return None
+
+        query = self._normalize_embedding(embedding)
+        scores = (self._matrix @ query) * self._scales
+
+        # Free and expired rows, and answers built from a different number of
+        # sources, must never win
+        scores[
+            (self._expires_at <= time.monotonic()) | (self._max_results != max_results)
+        ] = -np.inf
+
+        row = int(np.argmax(scores))
+        if scores[row] < self.similarity_threshold:
+            self.semantic_misses += 1
+            return None
+
+        self._rows.move_to_end(self._keys[row])
+        self.semantic_hits += 1
+        return self._values[row]
+
+    def put(
+        self,
+        question: str,
+        max_results: int,
+        embedding: List[float],
+        value: Dict[str, Any],
+    ) -> None:
+        """Cache an answer under the question text and its embedding"""
+        if self.max_size == 0:
+            return
+
+        key = (self.normalize_question(question), max_results)
+        vector = self._normalize_embedding(embedding)
+
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_size, vector.shape[0]), dtype=np.int8)
+
+        if key in self._rows:
+            self._evict(key)
+        elif not self._free_rows:
+            # Evict the least recently used entry to make room
+            self._evict(next(iter(self._rows)))
+
+        row = self._free_rows.pop()
+        self._matrix[row], self._scales[row] = self._quantize(vector)
+        self._keys[row] = key
+        self._values[row] = value
+        self._max_results[row] = max_results
+        self._expires_at[row] = time.monotonic() + self.ttl_seconds
+        self._rows[key] = row
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for observability"""
+        # Every request starts with one exact lookup
+        requests = self.exact_hits + self.exact_misses
+        return {
+            "size": len(self._rows),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+            "exact_hits": self.exact_hits,
+            "exact_misses": self.exact_misses,
+            "semantic_hits": self.semantic_hits,
+            "semantic_misses": self.semantic_misses,
+            "hit_rate": (
+                (self.exact_hits + self.semantic_hits) / requests if requests else 0.0
+            ),
+        }
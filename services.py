@@ -1,13 +1,20 @@
+import asyncio
+import logging
 import os
-from openai import AzureOpenAI
+import time
+import httpx
+import numpy as np
+import orjson
+from openai import DEFAULT_TIMEOUT, AsyncAzureOpenAI, BadRequestError
 from dotenv import load_dotenv
-from typing import List, Optional
-import requests
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from logging_config import get_logger
 
 # Load environment variables
 load_dotenv()
 
+logger = get_logger("services")
+
 
 class AzureOpenAIService:
     """
@@ -15,35 +22,162 @@ class AzureOpenAIService:
     This code encapsulates all Azure OpenAI operations in a reusable class
     """
 
-    def __init__(self):
-        # Initialize the Azure OpenAI client. Load credentials and create the OpenAI client
-        self.client = AzureOpenAI(
+    # Prompt pieces are identical for every request, so build them once
+    _SYSTEM_MESSAGE = {
+        "role": "system",
+        "content": """You are a helpful Python documentation assistant. Use the provided context from Python documentation to answer questions. 
+        If the context contains relevant information, use it to provide a detailed answer.
+        If the context doesn't contain enough information, acknowledge this and provide general Python knowledge to help the user.
+        Always be helpful and provide practical examples when possible.""",
+    }
+    _USER_PROMPT_TEMPLATE = """Context from Python documentation:
+        {context}
+
+        Question: {question}
+
+        Please provide a helpful answer based on the context above and your knowledge of Python."""
+    _CONTEXT_TEMPLATE = "Source: {source_file} (chunk {chunk_index})\n{content}"
+    _NO_CONTEXT = "No relevant context found in the documentation."
+
+    def __init__(self, http: Optional[httpx.AsyncClient] = None):
+        # Initialize the Azure OpenAI client. Load credentials and create the OpenAI client.
+        # An injected http client is shared with other services and owned by the caller;
+        # the SDK timeout is pinned so completions don't inherit its shorter one
+        self.client = AsyncAzureOpenAI(
             api_key=os.getenv("AZURE_OPENAI_KEY"),
             api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
             azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            http_client=http,
+            timeout=DEFAULT_TIMEOUT,
         )
+        self._owns_http = http is None
 
         # Store deployment names for easy access
         self.embedding_deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
         self.chat_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 
-    def get_embedding(self, text: str) -> Optional[List[float]]:
+        # Embedding micro-batcher, started by start_embedding_batcher()
+        self._batcher_task: Optional[asyncio.Task] = None
+
+    # Concurrent get_embedding calls are coalesced into one request of up to
+    # EMBEDDING_BATCH_SIZE inputs, waiting at most EMBEDDING_BATCH_WAIT seconds
+    EMBEDDING_BATCH_SIZE = 16
+    EMBEDDING_BATCH_WAIT = 0.010
+
+    def start_embedding_batcher(self) -> None:
+        # Must be called from a running event loop (e.g. the FastAPI lifespan)
+        self._embedding_queue = asyncio.Queue()
+        self._batch_tasks = set()
+        self._batcher_task = asyncio.create_task(self._embedding_batcher())
+
+    async def aclose(self) -> None:
+        # Stop the embedding batcher and release the HTTP connection pool (if ours)
+        if self._batcher_task is not None:
+            batcher_task, self._batcher_task = self._batcher_task, None
+            tasks = [batcher_task, *self._batch_tasks]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            # Nothing will pick up queued requests anymore, so fail them now
+            while not self._embedding_queue.empty():
+                self._fail_pending([self._embedding_queue.get_nowait()])
+        if self._owns_http:
+            await self.client.close()
+
+    async def get_embedding(self, text: str) -> Optional[List[float]]:
         # Convert text to vector embedding
         try:
-            response = self.client.embeddings.create(
-                input=text, model=self.embedding_deployment
-            )
-            return response.data[0].embedding
+            if self._batcher_task is None:
+                return (await self._embed_batch([text]))[0]
+
+            future = asyncio.get_running_loop().create_future()
+            await self._embedding_queue.put((text, future))
+            return await future
         except Exception as e:
             print(f"Error generating embedding: {e}")
             return None
 
-    def generate_completion(
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = await self.client.embeddings.create(
+            input=texts, model=self.embedding_deployment
+        )
+        # Each item carries the index of its input, so map back in order
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    @staticmethod
+    def _fail_pending(batch: List[tuple]) -> None:
+        # Callers awaiting a batch that will never be sent get an error, not a hang
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(RuntimeError("Embedding service is shutting down"))
+
+    async def _embedding_batcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._embedding_queue.get()]
+            deadline = loop.time() + self.EMBEDDING_BATCH_WAIT
+
+            try:
+                while len(batch) < self.EMBEDDING_BATCH_SIZE:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(
+                            await asyncio.wait_for(self._embedding_queue.get(), timeout)
+                        )
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                self._fail_pending(batch)
+                raise
+
+            # Send the batch in the background so the next one can start filling
+            task = asyncio.create_task(self._run_embedding_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_embedding_batch(self, batch: List[tuple]) -> None:
+        texts = [text for text, _ in batch]
+        try:
+            try:
+                results = await self._embed_batch(texts)
+            except BadRequestError:
+                if len(batch) == 1:
+                    raise
+                # One bad input (e.g. too many tokens) fails the whole request,
+                # so retry the inputs one by one and only fail the culprits.
+                # Anything else (throttling, timeouts, 5xx) fails the batch as is;
+                # splitting it would only multiply calls to a struggling service
+                results = await asyncio.gather(
+                    *(self._embed_batch([text]) for text in texts),
+                    return_exceptions=True,
+                )
+                results = [
+                    result if isinstance(result, Exception) else result[0]
+                    for result in results
+                ]
+        except asyncio.CancelledError:
+            self._fail_pending(batch)
+            raise
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def generate_completion(
         self, messages: List[dict], max_tokens: int = 500
     ) -> Optional[str]:
         # Generate text completion using GPT
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.chat_deployment,
                 messages=messages,
                 max_tokens=max_tokens,
@@ -54,51 +188,81 @@ class AzureOpenAIService:
             print(f"Error generating completion: {e}")
             return None
 
-    def generate_rag_response(
+    def build_rag_messages(
         self, question: str, context_documents: List[Dict]
-    ) -> Optional[str]:
-        """Generate response using retrieved documents as context"""
+    ) -> List[dict]:
+        """Build the chat messages for a question and its retrieved context"""
 
         # Combine context from retrieved documents
         if context_documents:
             context = "\n\n".join(
-                [
-                    f"Source: {doc['source_file']} (chunk {doc['chunk_index']})\n{doc['content']}"
-                    for doc in context_documents
-                ]
+                map(self._CONTEXT_TEMPLATE.format_map, context_documents)
             )
-            print("::::::::::::::::::::::::: Context 1 :::::::::::::::::::::::::")
-            print(context)
         else:
-            context = "No relevant context found in the documentation."
-            print("::::::::::::::::::::::::: Context 2 :::::::::::::::::::::::::")
-            print(context)
-
-        # Create system prompt for RAG
-        system_prompt = """You are a helpful Python documentation assistant. Use the provided context from Python documentation to answer questions. 
-        If the context contains relevant information, use it to provide a detailed answer.
-        If the context doesn't contain enough information, acknowledge this and provide general Python knowledge to help the user.
-        Always be helpful and provide practical examples when possible."""
-
-        # Create user prompt with context
-        user_prompt = f"""Context from Python documentation:
-        {context}
+            context = self._NO_CONTEXT
 
-        Question: {question}
-
-        Please provide a helpful answer based on the context above and your knowledge of Python."""
+        # Sizes only, and only when DEBUG is on; never the context itself
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "RAG context built",
+                context_len=len(context),
+                n_docs=len(context_documents),
+            )
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
+        return [
+            self._SYSTEM_MESSAGE,
+            {
+                "role": "user",
+                "content": self._USER_PROMPT_TEMPLATE.format(
+                    context=context, question=question
+                ),
+            },
         ]
 
-        return self.generate_completion(messages, max_tokens=800)
+    async def generate_rag_response(
+        self, question: str, context_documents: List[Dict]
+    ) -> Optional[str]:
+        """Generate response using retrieved documents as context"""
+        messages = self.build_rag_messages(question, context_documents)
+        return await self.generate_completion(messages, max_tokens=800)
+
+    async def generate_rag_response_stream(
+        self, question: str, context_documents: List[Dict]
+    ) -> AsyncIterator[str]:
+        """Stream the RAG answer token by token as GPT produces it"""
+        messages = self.build_rag_messages(question, context_documents)
+        stream = await self.client.chat.completions.create(
+            model=self.chat_deployment,
+            messages=messages,
+            max_tokens=800,
+            temperature=0.3,
+            stream=True,
+        )
+        async for chunk in stream:
+            # Azure sends a leading chunk with no choices (content filter results)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
 
 
 class AzureSearchService:
     # Service class to handle Azure AI Search operations
-    def __init__(self):
+
+    # Responses worth retrying, and how many times / how long to back off
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+    MAX_RETRIES = 2
+    RETRY_BACKOFF = 0.2
+
+    # Parts of the vector search request that never change
+    _SEARCH_BODY = {
+        "count": True,
+        "select": "id,source_file,content,chunk_index,embedding",
+    }
+    _VECTOR_QUERY = {"fields": "embedding", "kind": "vector"}
+
+    # Vector queries should be quick; fail fast rather than hold a request open
+    TIMEOUT = httpx.Timeout(2.5, connect=1.0)
+
+    def __init__(self, http: Optional[httpx.AsyncClient] = None):
         # Initialize the Azure Search client
 
         self.endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
@@ -109,34 +273,68 @@ class AzureSearchService:
         if not all([self.endpoint, self.api_key]):
             raise ValueError("Azure Search endpoint and API key must be configured")
 
-    def vector_search(
+        # Endpoint and index never change, so build URLs and headers once
+        base_url = f"{self.endpoint}/indexes/{self.index_name}"
+        self._search_url = f"{base_url}/docs/search?api-version=2023-11-01"
+        self._stats_url = f"{base_url}/stats?api-version=2023-11-01"
+        self._headers = {"Content-Type": "application/json", "api-key": self.api_key}
+
+        # Index stats are cached for SEARCH_STATS_TTL seconds as (fetched_at, stats)
+        self.stats_ttl = float(os.getenv("SEARCH_STATS_TTL", "60"))
+        self._stats_cache: Optional[Tuple[float, Dict]] = None
+
+        # Async HTTP client so queries reuse pooled keep-alive connections. An
+        # injected client is shared with other services and owned by the caller;
+        # otherwise create one whose transport retries failed connection attempts
+        self._owns_http = http is None
+        self.http = http or httpx.AsyncClient(
+            timeout=self.TIMEOUT,
+            transport=httpx.AsyncHTTPTransport(
+                retries=self.MAX_RETRIES,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+            ),
+        )
+
+    async def aclose(self) -> None:
+        # Release the underlying HTTP connection pool (if ours)
+        if self._owns_http:
+            await self.http.aclose()
+
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        # Retry throttled / transient server errors with exponential backoff
+        for attempt in range(self.MAX_RETRIES + 1):
+            response = await self.http.request(
+                method, url, headers=self._headers, timeout=self.TIMEOUT, **kwargs
+            )
+            if (
+                response.status_code not in self.RETRY_STATUSES
+                or attempt == self.MAX_RETRIES
+            ):
+                return response
+            await asyncio.sleep(self.RETRY_BACKOFF * 2**attempt)
+
+    async def vector_search(
         self, query_embedding: List[float], top_k: int = 3
     ) -> Optional[List[Dict]]:
         # Search for similar documents using vector similarity, given an embedding
 
-        url = f"{self.endpoint}/indexes/{self.index_name}/docs/search?api-version=2023-11-01"
-
-        headers = {"Content-Type": "application/json", "api-key": self.api_key}
-
         search_body = {
-            "count": True,
+            **self._SEARCH_BODY,
             "top": top_k,
             "vectorQueries": [
-                {
-                    "vector": query_embedding,
-                    "k": top_k,
-                    "fields": "embedding",
-                    "kind": "vector",
-                }
+                {**self._VECTOR_QUERY, "vector": query_embedding, "k": top_k}
             ],
-            "select": "id,source_file,content,chunk_index",
         }
 
         try:
-            response = requests.post(url, headers=headers, json=search_body)
+            # orjson encodes the 1536 query floats and decodes the returned hit
+            # embeddings much faster than the stdlib json httpx would use
+            response = await self._send(
+                "POST", self._search_url, content=orjson.dumps(search_body)
+            )
             if response.status_code == 200:
-                search_results = response.json()
-                return search_results.get("value", [])
+                search_results = orjson.loads(response.content)
+                return self._rerank(query_embedding, search_results.get("value", []))
             else:
                 print(f"Search error: {response.status_code}")
                 print(f"Response: {response.text}")
@@ -145,17 +343,46 @@ class AzureSearchService:
             print(f"Error searching documents: {e}")
             return None
 
-    def get_search_stats(self) -> Optional[Dict]:
-        # Get basic statistics about the search index
+    @staticmethod
+    def _rerank(query_embedding: List[float], documents: List[Dict]) -> List[Dict]:
+        # Score every hit by exact cosine similarity in one matrix-vector product,
+        # sort best first and drop the vectors before returning
+        if not documents:
+            return documents
+
+        matrix = np.asarray(
+            [doc.pop("embedding") for doc in documents], dtype=np.float32
+        )
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        scores = (matrix @ query) / np.where(norms == 0, 1.0, norms)
+
+        for doc, score in zip(documents, scores):
+            doc["score"] = float(score)
+            # Display snippets computed once per hit (and kept with cached answers):
+            # the chat UI shows 100 characters, /test-search shows 150
+            doc["preview"] = doc["content"][:100] + "..."
+            doc["long_preview"] = doc["content"][:150] + "..."
+
+        return sorted(documents, key=lambda doc: doc["score"], reverse=True)
 
-        url = f"{self.endpoint}/indexes/{self.index_name}/stats?api-version=2023-11-01"
+    async def get_search_stats(self) -> Optional[Dict]:
+        # Get basic statistics about the search index, reusing a recent result
+        # so frequent health probes don't each call Azure
 
-        headers = {"api-key": self.api_key}
+        now = time.monotonic()
+        if (
+            self._stats_cache is not None
+            and now - self._stats_cache[0] < self.stats_ttl
+        ):
+            return self._stats_cache[1]
 
         try:
-            response = requests.get(url, headers=headers)
+            response = await self._send("GET", self._stats_url)
             if response.status_code == 200:
-                return response.json()
+                stats = response.json()
+                self._stats_cache = (now, stats)
+                return stats
             else:
                 print(f"Stats error: {response.status_code}")
                 return None
@@ -1,3 +1,4 @@
+import functools
 import os
 import json
 import requests
@@ -11,9 +12,28 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Configuration is read once; evaluation loops call the pipeline many times
+EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
+CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
+SEARCH_URL = (
+    f"{SEARCH_ENDPOINT}/indexes/python-docs-index/docs/search?api-version=2023-11-01"
+)
+SEARCH_HEADERS = {
+    "Content-Type": "application/json",
+    "api-key": os.getenv("AZURE_SEARCH_KEY"),
+}
 
+# Most inputs the embeddings endpoint is sent in one request
+EMBEDDING_BATCH_SIZE = 1024
+
+# Keep-alive session so consecutive searches reuse one connection
+search_session = requests.Session()
+
+
+@functools.lru_cache(maxsize=1)
 def setup_azure_openai():
-    """Initialize Azure OpenAI client"""
+    """Initialize Azure OpenAI client (built once, then reused)"""
     client = AzureOpenAI(
         api_key=os.getenv("AZURE_OPENAI_KEY"),
         api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
@@ -25,24 +45,34 @@ def setup_azure_openai():
 def get_question_embedding(client, question: str):
     """Convert user question to embedding"""
     try:
-        response = client.embeddings.create(
-            input=question, model=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
-        )
+        response = client.embeddings.create(input=question, model=EMBEDDING_DEPLOYMENT)
         return response.data[0].embedding
     except Exception as e:
         print(f"Error generating question embedding: {e}")
         return None
 
 
-def search_similar_documents(question_embedding, top_k=3):
-    """Search for similar documents using vector similarity"""
-
-    endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
-    key = os.getenv("AZURE_SEARCH_KEY")
+def get_question_embeddings(client, questions: list):
+    """Convert many questions to embeddings, EMBEDDING_BATCH_SIZE per request"""
+    embeddings = []
+    try:
+        for start in range(0, len(questions), EMBEDDING_BATCH_SIZE):
+            response = client.embeddings.create(
+                input=questions[start : start + EMBEDDING_BATCH_SIZE],
+                model=EMBEDDING_DEPLOYMENT,
+            )
+            # Each item carries the index of its input, so map back in order
+            embeddings.extend(
+                item.embedding for item in sorted(response.data, key=lambda d: d.index)
+            )
+        return embeddings
+    except Exception as e:
+        print(f"Error generating question embeddings: {e}")
+        return None
 
-    url = f"{endpoint}/indexes/python-docs-index/docs/search?api-version=2023-11-01"
 
-    headers = {"Content-Type": "application/json", "api-key": key}
+def search_similar_documents(question_embedding, top_k=3):
+    """Search for similar documents using vector similarity"""
 
     search_body = {
         "count": True,
@@ -59,7 +89,9 @@ def search_similar_documents(question_embedding, top_k=3):
     }
 
     try:
-        response = requests.post(url, headers=headers, json=search_body)
+        response = search_session.post(
+            SEARCH_URL, headers=SEARCH_HEADERS, json=search_body
+        )
         if response.status_code == 200:
             return response.json()
         else:
@@ -89,7 +121,7 @@ Answer: Provide a helpful answer based on the context above. If the context does
 
     try:
         response = client.chat.completions.create(
-            model=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+            model=CHAT_DEPLOYMENT,
             messages=[
                 {
                     "role": "system",
@@ -121,6 +153,31 @@ def test_rag_pipeline(question: str):
     if not question_embedding:
         return
 
+    return answer_from_embedding(client, question, question_embedding)
+
+
+def run_rag_pipeline_many(questions: list):
+    """Test the RAG pipeline over an evaluation set, embedding all questions up front"""
+
+    client = setup_azure_openai()
+
+    print(f"Step 1: Converting {len(questions)} questions to embeddings...")
+    question_embeddings = get_question_embeddings(client, questions)
+    if not question_embeddings:
+        return
+
+    answers = []
+    for question, question_embedding in zip(questions, question_embeddings):
+        print(f"\nQuestion: {question}")
+        print("=" * 50)
+        answers.append(answer_from_embedding(client, question, question_embedding))
+
+    return answers
+
+
+def answer_from_embedding(client, question: str, question_embedding):
+    """Run the search and generation steps for an already embedded question"""
+
     # Step 3: Search for similar documents
     print("Step 2: Searching for relevant documents...")
     search_results = search_similar_documents(question_embedding)
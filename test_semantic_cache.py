@@ -0,0 +1,98 @@
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+DIM = 64
+
+
+def embedding(seed: int):
+    return np.random.default_rng(seed).standard_normal(DIM).tolist()
+
+
+def answer(text: str):
+    return {"answer": text, "documents": []}
+
+
+def test_exact_hit_ignores_case_and_whitespace():
+    cache = SemanticCache()
+    cache.put("How do I use lists?", 3, embedding(0), answer("lists"))
+
+    assert cache.get("  how do i   USE lists? ", 3) == answer("lists")
+
+
+def test_max_results_is_part_of_the_key():
+    cache = SemanticCache()
+    cache.put("How do I use lists?", 3, embedding(0), answer("three"))
+    cache.put("How do I use lists?", 5, embedding(0), answer("five"))
+
+    assert cache.get("How do I use lists?", 3) == answer("three")
+    assert cache.get("How do I use lists?", 5) == answer("five")
+    assert cache.get("How do I use lists?", 4) is None
+    assert cache.stats()["size"] == 2
+
+
+def test_find_similar_only_matches_same_max_results():
+    cache = SemanticCache(similarity_threshold=0.95)
+    vector = np.asarray(embedding(0))
+    cache.put("How do I use lists?", 3, vector.tolist(), answer("lists"))
+
+    nearby = (vector + 0.01 * np.asarray(embedding(1))).tolist()
+    assert cache.find_similar(nearby, 3) == answer("lists")
+    assert cache.find_similar(nearby, 5) is None
+    assert cache.find_similar(embedding(2), 3) is None
+
+
+def test_expired_entries_are_not_served():
+    cache = SemanticCache(ttl_seconds=-1)
+    cache.put("How do I use lists?", 3, embedding(0), answer("lists"))
+
+    assert cache.get("How do I use lists?", 3) is None
+    assert cache.find_similar(embedding(0), 3) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(max_size=2)
+    cache.put("first question", 3, embedding(0), answer("first"))
+    cache.put("second question", 3, embedding(1), answer("second"))
+    cache.get("first question", 3)
+    cache.put("third question", 3, embedding(2), answer("third"))
+
+    assert cache.get("first question", 3) == answer("first")
+    assert cache.get("second question", 3) is None
+    assert cache.get("third question", 3) == answer("third")
+
+
+def test_stats_count_one_lookup_per_request():
+    cache = SemanticCache()
+
+    # Miss, then store the generated answer
+    assert cache.get("How do I use lists?", 3) is None
+    assert cache.find_similar(embedding(0), 3) is None
+    cache.put("How do I use lists?", 3, embedding(0), answer("three"))
+
+    # Same question with a different max_results is a miss, not a hit
+    assert cache.get("How do I use lists?", 5) is None
+    assert cache.find_similar(embedding(0), 5) is None
+    cache.put("How do I use lists?", 5, embedding(0), answer("five"))
+
+    # Exact repeat and near-identical question are hits
+    assert cache.get("How do I use lists?", 3) == answer("three")
+    assert cache.get("Using lists", 5) is None
+    assert cache.find_similar(embedding(0), 5) == answer("five")
+
+    stats = cache.stats()
+    assert stats["exact_hits"] == 1
+    assert stats["exact_misses"] == 3
+    assert stats["semantic_hits"] == 1
+    assert stats["semantic_misses"] == 2
+    assert stats["hit_rate"] == 0.5
+
+
+def test_zero_max_size_disables_caching():
+    cache = SemanticCache(max_size=0)
+    cache.put("How do I use lists?", 3, embedding(0), answer("lists"))
+
+    assert cache.get("How do I use lists?", 3) is None
+    assert cache.find_similar(embedding(0), 3) is None
+    assert cache.stats()["size"] == 0